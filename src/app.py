@@ -1,13 +1,19 @@
 import streamlit as st
 import requests
 import logging
+import hashlib
 import io
 import os
+import shutil
+import struct
+import subprocess
 import tempfile
-from pydub import AudioSegment
-from pydub.generators import Sine
-from elevenlabs import ElevenLabs
+import threading
+import numpy as np
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
@@ -34,145 +40,390 @@ VOICE_IDS = {
     "남성 화자": "3MMlKavlOQfPfUwRwYNI"    # Elevenlabs 남성 보이스 ID
 }
 
-def download_bgm(url):
-    """배경음악 다운로드"""
+# 믹싱 포맷 (44.1kHz 스테레오 16bit)
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+# 믹싱에 쓰는 dB 게인의 Q15 고정소수점 값 (1.0 = 32768)
+Q15_ONE = 32768
+GAIN_Q15 = {db: int(10 ** (db / 20) * Q15_ONE) for db in (-10, 3)}
+
+# 다운로드 타임아웃 (연결, 읽기)
+DOWNLOAD_TIMEOUT = (3, 30)
+# 다운로드 시 디스크로 복사하는 청크 크기
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 디코딩된 배경음악/효과음을 보관하는 로컬 캐시 디렉터리
+CACHE_DIR = os.path.expanduser("~/.cache/opening-generator")
+
+# TTS 설정
+TTS_MODEL_ID = "eleven_multilingual_v2"
+# 영어 텍스트(제목, 제작사 소개)는 첫 응답이 훨씬 빠른 Flash 모델 사용
+TTS_ENGLISH_MODEL_ID = "eleven_flash_v2_5"
+# 헤더 없는 16bit 모노 PCM으로 받아 디코딩 과정을 생략
+# (44.1kHz PCM은 Pro 요금제 이상에서만 제공되므로 모든 요금제에서 쓸 수 있는 22.05kHz로 받아 2배 업샘플링)
+TTS_SAMPLE_RATE = 22050
+TTS_OUTPUT_FORMAT = f"pcm_{TTS_SAMPLE_RATE}"
+
+# TTS 결과 디스크 캐시 (최근 사용 순으로 최대 개수만 유지)
+TTS_CACHE_DIR = os.path.join(CACHE_DIR, "tts")
+TTS_CACHE_MAX_ENTRIES = 200
+
+# 제목과 제작사 소개 음성 사이의 쉼
+OUTRO_PAUSE_MS = 800
+
+@st.cache_resource
+def get_session():
+    """S3 다운로드에 재사용할 HTTP 세션 (커넥션 풀 유지)"""
+    session = requests.Session()
+    # 풀에 남아 있던 연결이 끊긴 경우 등 연결 단계 오류는 두 번까지 재시도
+    session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=2))
+    return session
+
+@st.cache_resource
+def get_client():
+    """TTS 요청에 재사용할 Elevenlabs 클라이언트 (API 연결 유지)"""
+    # SDK 로딩이 무거우므로 첫 화면을 그린 뒤 처음 TTS를 요청할 때 불러옴
+    from elevenlabs import ElevenLabs
+    return ElevenLabs(api_key=ELEVENLABS_API_KEY)
+
+@st.cache_resource
+def get_executor():
+    """다운로드, TTS 작업에 공용으로 쓰는 스레드 풀"""
+    return ThreadPoolExecutor(max_workers=8)
+
+@st.cache_resource
+def get_outro_executor():
+    """제작사 소개 음성 합성 전용 스레드 풀 (공용 풀 작업이 기다려도 같은 풀에 막히지 않도록 분리)"""
+    return ThreadPoolExecutor(max_workers=2)
+
+def run_in_background(fn, *args):
+    """공용 스레드 풀에서 함수를 실행하고 Future를 반환"""
+    # 작업 스레드에서도 st.error가 현재 페이지에 표시되도록 실행 컨텍스트 연결
+    ctx = get_script_run_ctx()
+    
+    def task():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    
+    return get_executor().submit(task)
+
+def download_audio(url, suffix):
+    """배경음악/효과음을 임시 파일로 다운로드"""
+    with get_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        # 응답 전체를 메모리에 올리지 않고 청크 단위로 바로 파일에 기록
+        response.raw.decode_content = True
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+            try:
+                shutil.copyfileobj(response.raw, temp_file, DOWNLOAD_CHUNK_SIZE)
+            except BaseException:
+                # 수신 도중 실패하면 받다 만 파일을 남기지 않음
+                os.unlink(temp_file.name)
+                raise
+        return temp_file.name
+
+def write_cache_file(path, chunks):
+    """캐시 파일을 청크 단위로 저장 (다른 프로세스가 쓰다 만 파일을 읽지 않도록 임시 파일에 쓴 뒤 교체)"""
+    cache_dir = os.path.dirname(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as temp_file:
+        try:
+            for chunk in chunks:
+                temp_file.write(chunk)
+        except BaseException:
+            # 수신 도중 실패하면 쓰다 만 파일을 남기지 않음
+            os.unlink(temp_file.name)
+            raise
+    os.replace(temp_file.name, path)
+
+def cached_pcm_path(url):
+    """URL과 디코딩 포맷(샘플레이트, 채널 수)에 대응하는 디코딩 캐시 파일 경로"""
+    key = hashlib.sha1(f"{url}|{SAMPLE_RATE}|{CHANNELS}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.s16le")
+
+# 진행 상황은 생성 화면의 상태 영역에서 표시하므로 캐시 함수 자체의 스피너는 숨김
+@st.cache_resource(show_spinner=False)
+def load_asset(url, suffix):
+    """배경음악/효과음을 디코딩된 s16le 파일로 디스크에 캐시하고 메모리 매핑으로 불러옴"""
+    path = cached_pcm_path(url)
+    if not os.path.exists(path):
+        source_path = download_audio(url, suffix)
+        try:
+            samples = decode_pcm(source_path)
+        finally:
+            os.unlink(source_path)
+        
+        write_cache_file(path, [samples])
+    
+    # 실제로 읽는 앞부분 페이지만 디스크에서 올라옴
+    return np.memmap(path, dtype=np.int16, mode='r').reshape(-1, CHANNELS)
+
+def load_audio(url, suffix):
+    """캐시된 배경음악/효과음 불러오기"""
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-            temp_file.write(response.content)
-            temp_file.close()
-            return temp_file.name
-        else:
-            st.error(f"배경음악 다운로드 실패: {response.status_code}")
-            return None
+        return load_asset(url, suffix)
     except Exception as e:
-        st.error(f"배경음악 다운로드 중 오류 발생: {str(e)}")
+        st.error(f"오디오 다운로드 중 오류 발생: {str(e)}")
         return None
 
 def is_english(text):
     """텍스트가 영어인지 확인하는 함수"""
-    # 영어 알파벳, 숫자, 공백, 문장부호만 포함되어 있는지 확인
-    return all(ord(char) < 128 for char in text.replace(' ', '').replace('.', '').replace(',', '').replace('!', '').replace('?', ''))
+    # 영어 알파벳, 숫자, 공백, 문장부호만 포함되어 있는지 확인 (공백/문장부호도 ASCII이므로 따로 제거하지 않음)
+    return text.isascii()
+
+def tts_model_id(text):
+    """제목 언어에 맞는 TTS 모델 ID"""
+    return TTS_ENGLISH_MODEL_ID if is_english(text) else TTS_MODEL_ID
+
+def tts_cache_path(text, voice_id, speed):
+    """TTS 요청(텍스트, 화자, 속도, 모델, 포맷)에 대응하는 캐시 파일 경로"""
+    key = hashlib.sha1(f"{text}|{voice_id}|{speed}|{tts_model_id(text)}|{TTS_OUTPUT_FORMAT}".encode()).hexdigest()
+    return os.path.join(TTS_CACHE_DIR, f"{key}.s16le")
+
+def prune_tts_cache():
+    """최근에 사용하지 않은 TTS 캐시부터 지워 최대 개수를 유지"""
+    entries = []
+    for entry in os.scandir(TTS_CACHE_DIR):
+        if not entry.name.endswith('.s16le'):
+            continue
+        try:
+            entries.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            # 다른 작업이 먼저 지운 항목은 건너뜀
+            continue
+    entries.sort(reverse=True)
+    for _, path in entries[TTS_CACHE_MAX_ENTRIES:]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+def collect_chunks(chunks, collected):
+    """청크를 그대로 넘겨주면서 collected 리스트에도 모아 둠"""
+    for chunk in chunks:
+        collected.append(chunk)
+        yield chunk
+
+def synthesize_speech(text, voice_id, speed):
+    """텍스트를 TTS_SAMPLE_RATE 모노 PCM 바이트로 합성 (디스크 캐시 사용, 실패 시 예외 발생)"""
+    # 같은 요청은 디스크 캐시에서 바로 반환 (최근 사용 시각 갱신)
+    # 확인과 읽기 사이에 다른 작업이 캐시를 지울 수 있으므로 열기에 실패하면 새로 합성
+    cache_path = tts_cache_path(text, voice_id, speed)
+    try:
+        with open(cache_path, 'rb') as f:
+            os.utime(f.fileno())
+            return f.read()
+    except FileNotFoundError:
+        pass
+    
+    # 기본 속도가 아니면 속도만 지정 (나머지 음성 설정은 화자 기본값 사용)
+    options = {}
+    if speed != 1.0:
+        from elevenlabs import VoiceSettings
+        options["voice_settings"] = VoiceSettings(speed=speed)
+    
+    # 스트리밍 엔드포인트로 음성 생성 (생성되는 대로 청크가 도착)
+    audio_stream = get_client().text_to_speech.stream(
+        voice_id=voice_id,
+        text=text,
+        model_id=tts_model_id(text),
+        output_format=TTS_OUTPUT_FORMAT,
+        **options
+    )
+    
+    # 응답을 모아 두지 않고 받는 대로 캐시 파일에 기록하고, 반환할 바이트도 함께 보관
+    # (정리 과정에서 다른 작업이 캐시를 지워도 다시 읽지 않도록)
+    chunks = []
+    write_cache_file(cache_path, collect_chunks(audio_stream, chunks))
+    prune_tts_cache()
+    return b''.join(chunks)
+
+@st.cache_resource(show_spinner=False)
+def outro_speech(english, voice_id, speed):
+    """고정된 제작사 소개 음성은 화자/속도별로 한 번만 합성해 메모리에 보관"""
+    outro = "produced by nadio." if english else "제작. 나디오."
+    return synthesize_speech(outro, voice_id, speed)
+
+def synthesize_opening_speech(text, voice_id, speed):
+    """제목 음성 뒤에 제작사 소개 음성을 이어 붙인 PCM 바이트 (실패 시 예외 발생)"""
+    # 영어/한글 구분하여 제작사 소개 음성을 제목과 동시에 요청 (캐시되어 있으면 바로 반환)
+    outro_future = get_outro_executor().submit(outro_speech, is_english(text), voice_id, speed)
+    
+    # 제목 끝에 마침표 추가해 제목만 합성
+    title_with_period = f"{text}..." if not text.endswith('.') else text
+    title_audio = synthesize_speech(title_with_period, voice_id, speed)
+    
+    # 제작사 소개 음성을 쉼 뒤에 이어 붙임
+    outro_audio = outro_future.result()
+    pause = bytes(OUTRO_PAUSE_MS * TTS_SAMPLE_RATE // 1000 * 2)  # 16bit 모노 무음
+    return title_audio + pause + outro_audio
 
 def text_to_speech(text, voice_id, speed=1.0):
     """Elevenlabs TTS API를 사용하여 음성을 생성하는 함수"""
     try:
-        client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
-        
-        # 제목 끝에 마침표 추가하고, 영어/한글 구분하여 제작사 소개 텍스트 구성
-        title_with_period = f"{text}..." if not text.endswith('.') else text
-        outro = "    produced by nadio." if is_english(text) else "    제작. 나디오."
-        full_text = f"{title_with_period}\n\n{outro}"
-        
-        # 음성 생성
-        audio_stream = client.text_to_speech.convert(
-            voice_id=voice_id,
-            text=full_text,
-            model_id="eleven_multilingual_v2",
-            output_format="mp3_44100_128"
-        )
-        
-        # 스트림을 바이트로 변환
-        if hasattr(audio_stream, 'read'):
-            audio_bytes = audio_stream.read()
-        elif isinstance(audio_stream, (bytes, bytearray)):
-            audio_bytes = audio_stream
-        else:
-            audio_bytes = b''.join(chunk for chunk in audio_stream)
-        
-        # 임시 파일로 저장 (mp3 형식으로)
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        temp_file.write(audio_bytes)
-        temp_file.close()
-        
-        return temp_file.name
-        
+        return synthesize_opening_speech(text, voice_id, speed)
     except Exception as e:
         st.error(f"TTS 변환 중 오류가 발생했습니다: {str(e)}")
         return None
 
-def process_audio_files(bgm_path, tts_path, swoosh_path):
-    """배경음악, 효과음, TTS 음성을 결합하는 함수"""
+def prefetch_tts():
+    """작품명 입력이 끝나면 생성 버튼을 누르기 전에 TTS를 미리 요청"""
+    title = st.session_state.title
+    if not title:
+        return
+    # 폼 안의 화자/속도는 마지막으로 제출된 값(처음에는 기본값)을 기준으로 함
+    voice_id = VOICE_IDS[st.session_state.get("voice", next(iter(VOICE_IDS)))]
+    speed = st.session_state.get("speed", 1.0)
+    # 미리 요청한 결과는 제출하지 않을 수도 있으므로 화면에 오류를 표시하지 않는 함수로 요청
+    st.session_state.tts_prefetch = ((title, voice_id, speed), run_in_background(synthesize_opening_speech, title, voice_id, speed))
+
+def take_prefetched_tts(title, voice_id, speed):
+    """미리 요청해 둔 TTS Future를 꺼냄 (입력이 다르면 None)"""
+    key, future = st.session_state.pop("tts_prefetch", (None, None))
+    return future if key == (title, voice_id, speed) else None
+
+def resolve_tts(prefetched, title, voice_id, speed):
+    """미리 요청해 둔 TTS 결과를 쓰고, 없거나 실패했으면 새로 생성"""
+    if prefetched is not None:
+        try:
+            return prefetched.result()
+        except Exception:
+            # 미리 요청이 실패하면 다시 요청하고, 오류는 그 결과로만 표시
+            pass
+    return text_to_speech(title, voice_id, speed)
+
+def ms_to_frames(ms):
+    """밀리초를 프레임 수로 변환"""
+    return ms * SAMPLE_RATE // 1000
+
+def encode_mp3(samples):
+    """int16 PCM 배열을 ffmpeg 표준입력으로 넘겨 192kbps CBR MP3 바이트로 인코딩"""
+    # 구간을 나눠 병렬 인코딩한 뒤 이어 붙이면 경계마다 인코더 지연/패딩으로 무음이 끼므로
+    # 하나의 인코더로 처리 (25초 분량 기준 0.3초 안팎)
+    result = subprocess.run(
+        [
+            "ffmpeg", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-i", "pipe:0",
+            "-c:a", "libmp3lame",
+            "-b:a", "192k",
+            "-f", "mp3", "pipe:1"
+        ],
+        input=samples.tobytes(),
+        capture_output=True,
+        check=True
+    )
+    return result.stdout
+
+def find_wav_data(wav):
+    """WAV 바이트에서 채널 수와 PCM 데이터 시작 위치를 찾음"""
+    channels = None
+    offset = 12  # RIFF 헤더 이후
+    while offset + 8 <= len(wav):
+        chunk_id, chunk_size = struct.unpack_from('<4sI', wav, offset)
+        if chunk_id == b'fmt ':
+            channels = struct.unpack_from('<H', wav, offset + 10)[0]
+        elif chunk_id == b'data':
+            return channels, offset + 8
+        offset += 8 + chunk_size + (chunk_size & 1)
+    raise ValueError("WAV 데이터 청크를 찾을 수 없습니다")
+
+def to_stereo(samples):
+    """모노 int16 배열을 스테레오로 복제 (ffmpeg의 모노→스테레오 변환은 -3dB로 섞이므로 직접 처리)"""
+    if samples.shape[1] == 1:
+        samples = np.repeat(samples, CHANNELS, axis=1)
+    return samples
+
+def upsample_tts(samples):
+    """TTS_SAMPLE_RATE 모노 int16 배열을 SAMPLE_RATE로 정수배 업샘플링 (카이저 창 sinc 저역통과 필터)"""
+    factor = SAMPLE_RATE // TTS_SAMPLE_RATE
+    # 원래 샘플 사이에 0을 끼워 넣고 원래 나이퀴스트 주파수 위를 걸러 보간
+    stuffed = np.zeros(len(samples) * factor)
+    stuffed[::factor] = samples
+    taps = np.arange(-16 * factor, 16 * factor + 1)
+    kernel = np.sinc(taps / factor) * np.kaiser(len(taps), 8.0)
+    upsampled = np.convolve(stuffed, kernel, mode='same')
+    return np.clip(np.rint(upsampled), -32768, 32767).astype(np.int16)
+
+def decode_pcm(path):
+    """ffmpeg로 오디오 파일을 44.1kHz 스테레오 int16 배열로 디코딩"""
+    # 채널 수는 원본 그대로 디코딩한 뒤 직접 스테레오로 맞춤
+    command = [
+        "ffmpeg", "-loglevel", "error", "-i", path,
+        "-ar", str(SAMPLE_RATE), "-af", "aformat=channel_layouts=mono|stereo",
+        "-c:a", "pcm_s16le", "-fflags", "+bitexact", "-f", "wav", "pipe:1"
+    ]
+    wav = subprocess.run(command, capture_output=True, check=True).stdout
+    channels, data_offset = find_wav_data(wav)
+    return to_stereo(np.frombuffer(wav, dtype=np.int16, offset=data_offset).reshape(-1, channels))
+
+def apply_gain_q15(section, gain):
+    """int32 구간에 Q15 게인(상수 또는 프레임별 배열)을 임시 배열 없이 제자리 적용"""
+    section *= gain
+    section >>= 15
+
+def process_audio_files(bgm_samples, tts_audio, swoosh_samples):
+    """배경음악, 효과음, TTS 음성을 결합해 int16 PCM 배열로 반환하는 함수"""
     try:
-        # 오디오 파일 불러오기
-        bgm = AudioSegment.from_mp3(bgm_path)
-        tts = AudioSegment.from_mp3(tts_path)
-        swoosh = AudioSegment.from_wav(swoosh_path)
-        
-        # 시작 6초 동안의 배경음악 (원본 볼륨)
-        initial_duration = 6000  # 6초로 변경
-        initial_bgm = bgm[:initial_duration]
-        
-        # 효과음 볼륨 조정
-        swoosh = swoosh + 3
-        
-        # TTS에 페이드인 적용
-        tts = tts.fade_in(50)
-        
-        # 효과음이 재생되는 동안의 배경음악
-        bgm_during_swoosh = bgm[initial_duration:initial_duration + len(swoosh)]
-        bgm_during_swoosh = bgm_during_swoosh.fade(
-            from_gain=0,
-            to_gain=-10,
-            start=0,
-            duration=len(swoosh)
-        )
+        # TTS는 모노 PCM 바이트이므로 믹싱 샘플레이트로 올린 뒤 스테레오로 변환 (배경음악/효과음은 디코딩된 상태로 전달됨)
+        tts_samples = to_stereo(upsample_tts(np.frombuffer(tts_audio, dtype=np.int16)).reshape(-1, 1))
         
-        # TTS와 함께 깔릴 배경음악
-        bgm_during_tts = bgm[initial_duration + len(swoosh):initial_duration + len(swoosh) + len(tts)] - 10
+        # 구간 경계 (프레임 단위)
+        swoosh_start = ms_to_frames(6000)               # 시작 6초 동안은 배경음악만 (원본 볼륨)
+        tts_start = swoosh_start + len(swoosh_samples)
+        tts_end = tts_start + len(tts_samples)
+        fade_start = tts_end + ms_to_frames(2500)       # TTS 이후 2.5초 유지
+        total_frames = fade_start + ms_to_frames(3000)  # 3초 페이드아웃
         
-        # TTS 이후 배경음악
-        post_tts_duration = 2500  # 2.5초
-        fade_duration = 3000      # 3초
-        total_length = initial_duration + len(swoosh) + len(tts)
-        bgm_after_tts = bgm[total_length:total_length + post_tts_duration] - 10
-        bgm_fadeout = bgm[total_length + post_tts_duration:total_length + post_tts_duration + fade_duration] - 10
-        bgm_fadeout = bgm_fadeout.fade_out(duration=fade_duration)
+        # 결과 버퍼에 배경음악 앞부분을 복사 (배경음악이 짧으면 나머지는 무음)
+        out = np.zeros((total_frames, CHANNELS), dtype=np.int32)
+        bgm_frames = min(len(bgm_samples), total_frames)
+        out[:bgm_frames] = bgm_samples[:bgm_frames]
         
-        # 순차적으로 오디오 결합
-        combined = initial_bgm
+        # 배경음악 게인은 구간별로 결과 버퍼에 제자리 적용 (시작 6초는 원본 볼륨)
+        # 효과음 구간: 0dB → -10dB 페이드
+        apply_gain_q15(out[swoosh_start:tts_start], np.linspace(Q15_ONE, GAIN_Q15[-10], tts_start - swoosh_start).astype(np.int32)[:, None])
+        # TTS 구간 및 이후: -10dB
+        apply_gain_q15(out[tts_start:fade_start], GAIN_Q15[-10])
+        # 마지막 3초: -10dB 상태에서 선형 페이드아웃
+        apply_gain_q15(out[fade_start:], np.linspace(GAIN_Q15[-10], 0, total_frames - fade_start).astype(np.int32)[:, None])
         
-        # 효과음과 배경음악 오버레이
-        swoosh_segment = bgm_during_swoosh.overlay(swoosh)
-        combined = combined + swoosh_segment
+        # 효과음 오버레이 (+3dB)
+        swoosh = swoosh_samples.astype(np.int32)
+        apply_gain_q15(swoosh, GAIN_Q15[3])
+        out[swoosh_start:tts_start] += swoosh
         
-        # TTS와 배경음악 오버레이
-        tts_with_bgm = bgm_during_tts.overlay(tts)
-        combined = combined + tts_with_bgm
+        # TTS 오버레이 (50ms 페이드인)
+        tts = tts_samples.astype(np.int32)
+        fade_in_frames = min(ms_to_frames(50), len(tts))
+        apply_gain_q15(tts[:fade_in_frames], np.linspace(0, Q15_ONE, fade_in_frames).astype(np.int32)[:, None])
+        out[tts_start:tts_end] += tts
         
-        # TTS 이후 배경음악 추가
-        combined = combined + bgm_after_tts + bgm_fadeout
-        
-        # CBR MP3로 저장
-        output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3').name
-        combined.export(
-            output_path,
-            format='mp3',
-            bitrate='192k',
-            parameters=[
-                "-ar", "44100",
-                "-ac", "2",
-                "-c:a", "libmp3lame",
-                "-b:a", "192k",
-                "-f", "mp3"
-            ]
-        )
-        
-        return output_path
+        np.clip(out, -32768, 32767, out=out)
+        return out.astype(np.int16)
     except Exception as e:
         st.error(f"오디오 처리 중 오류가 발생했습니다: {str(e)}")
         return None
 
+def export_mp3(samples):
+    """믹싱 결과를 CBR MP3 바이트로 인코딩하는 함수"""
+    try:
+        return encode_mp3(samples)
+    except Exception as e:
+        st.error(f"MP3 인코딩 중 오류가 발생했습니다: {str(e)}")
+        return None
+
 def main():
     st.title("📚 이어가다 오디오북 오프닝 생성기")
     
+    # 작품명 입력 (입력이 끝나면 TTS를 미리 요청할 수 있도록 폼 밖에 둠)
+    title = st.text_input("작품명을 입력하세요", key="title", on_change=prefetch_tts)
+    
     # 입력 폼
     with st.form("opening_form"):
         col1, col2 = st.columns(2)
         
         with col1:
-            title = st.text_input("작품명을 입력하세요")
             bgm_selection = st.selectbox(
                 "배경음악을 선택하세요",
                 list(BGM_URLS.keys())
@@ -181,69 +432,70 @@ def main():
         with col2:
             voice_selection = st.selectbox(
                 "화자를 선택하세요",
-                list(VOICE_IDS.keys())
+                list(VOICE_IDS.keys()),
+                key="voice"
             )
             speed = st.slider(
                 "음성 속도",
-                min_value=0.5,
-                max_value=2.0,
+                min_value=0.7,  # Elevenlabs가 지원하는 속도 범위
+                max_value=1.2,
                 value=1.0,
-                step=0.1
+                step=0.1,
+                key="speed"
             )
         
         submitted = st.form_submit_button("오프닝 생성", use_container_width=True)
     
     if submitted and title:
-        with st.spinner('오프닝 생성 중...'):
-            # 필요한 모든 오디오 파일 다운로드
-            temp_files = []
-            
-            # 배경음악 다운로드
-            response = requests.get(BGM_URLS[bgm_selection])
-            if response.status_code == 200:
-                bgm_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3').name
-                with open(bgm_path, 'wb') as f:
-                    f.write(response.content)
-                temp_files.append(bgm_path)
-            
-            # 효과음 다운로드
-            response = requests.get(SWOOSH_EFFECT_URL)
-            if response.status_code == 200:
-                swoosh_path = tempfile.NamedTemporaryFile(delete=False, suffix='.wav').name
-                with open(swoosh_path, 'wb') as f:
-                    f.write(response.content)
-                temp_files.append(swoosh_path)
-            
-            # TTS 생성
-            tts_path = text_to_speech(title, VOICE_IDS[voice_selection], speed)
-            if tts_path:
-                temp_files.append(tts_path)
-            
-            if all([bgm_path, swoosh_path, tts_path]):
-                # 오디오 처리
-                final_path = process_audio_files(bgm_path, tts_path, swoosh_path)
-                
-                if final_path:
-                    # 결과 재생
-                    with open(final_path, 'rb') as audio_file:
-                        audio_data = audio_file.read()
-                        st.audio(audio_data, format='audio/mp3')
-                        
-                        # 다운로드 버튼
-                        st.download_button(
-                            label="오프닝 오디오 다운로드",
-                            data=audio_data,
-                            file_name=f"opening_{title}.mp3",
-                            mime="audio/mp3",
-                            use_container_width=True
-                        )
-                    
-                    temp_files.append(final_path)
+        # 진행 상황만 상태 영역에 쓰고, 오류 메시지는 작업 스레드와 같이 상태 영역 밖에 표시되도록 with 블록을 쓰지 않음
+        status = st.status('오프닝 생성 중...')
+        
+        # 배경음악/효과음 다운로드와 TTS 생성을 동시에 진행
+        bgm_future = run_in_background(load_audio, BGM_URLS[bgm_selection], '.mp3')
+        swoosh_future = run_in_background(load_audio, SWOOSH_EFFECT_URL, '.wav')
+        voice_id = VOICE_IDS[voice_selection]
+        prefetched = take_prefetched_tts(title, voice_id, speed)
+        tts_future = run_in_background(resolve_tts, prefetched, title, voice_id, speed)
+        
+        # 끝나는 순서대로 진행 상황 표시
+        futures = {bgm_future: "배경음악", swoosh_future: "효과음", tts_future: "음성"}
+        status.update(label="배경음악, 효과음, 음성 준비 중...")
+        for future in as_completed(futures):
+            # 실패한 작업은 각 함수에서 오류 메시지를 표시함
+            if future.result() is not None:
+                status.write(f"{futures[future]} 준비 완료")
+        bgm = bgm_future.result()
+        swoosh = swoosh_future.result()
+        tts_audio = tts_future.result()
+        audio_data = None
+        
+        if bgm is not None and swoosh is not None and tts_audio:
+            # 오디오 처리
+            status.update(label="믹싱 중...")
+            mixed = process_audio_files(bgm, tts_audio, swoosh)
+            if mixed is not None:
+                status.update(label="MP3 인코딩 중...")
+                # 인코딩과 겹쳐서 진행할 작업이 남아 있지 않으므로 작업 스레드로 넘기지 않고 바로 실행
+                audio_data = export_mp3(mixed)
+        
+        if audio_data:
+            status.update(label="오프닝 생성 완료", state="complete", expanded=False)
+        else:
+            status.update(label="오프닝 생성 실패", state="error", expanded=True)
+        
+        # 결과는 접히는 진행 상황 영역 밖에 표시
+        if audio_data:
+            # 결과 재생
+            st.audio(audio_data, format='audio/mp3')
             
-            # 임시 파일 삭제
-            for temp_file in temp_files:
-                if os.path.exists(temp_file):
-                    os.unlink(temp_file)
+            # 다운로드 버튼
+            st.download_button(
+                label="오프닝 오디오 다운로드",
+                data=audio_data,
+                file_name=f"opening_{title}.mp3",
+                mime="audio/mp3",
+                use_container_width=True
+            )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file